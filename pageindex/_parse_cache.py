@@ -0,0 +1,44 @@
+"""On-disk parse-tree cache keyed by source content hash.
+
+Complements the per-run mtime cache in page_index_code: because the key is
+a hash of the source itself, hits survive checkouts, copies and touch-only
+changes. Entries are pickled file-tree dicts written atomically, stored
+under ~/.cache/pageindex/ast/ (XDG_CACHE_HOME is honored when set).
+"""
+
+import os
+import pickle
+
+# Bump to invalidate all entries when a parser's output format changes
+_CACHE_VERSION = '1'
+
+_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'pageindex', 'ast'
+)
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(_CACHE_DIR, f'{_CACHE_VERSION}-{key}.pickle')
+
+
+def get(key: str):
+    """Return the cached tree for `key`, or None on a miss or bad entry."""
+    try:
+        with open(_entry_path(key), 'rb') as f:
+            return pickle.load(f)
+    except (IOError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def put(key: str, tree) -> None:
+    """Store `tree` under `key`; failures are silent (the cache is best-effort)."""
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        entry_path = _entry_path(key)
+        tmp_path = f'{entry_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+    except IOError:
+        pass
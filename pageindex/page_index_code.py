@@ -1,5 +1,10 @@
 import os
 import asyncio
+import functools
+import hashlib
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Optional
 try:
     from .utils import (
@@ -7,9 +12,9 @@ try:
         write_node_id,
         format_structure,
         generate_node_summary,
-        structure_to_list,
         create_clean_structure_for_description,
         generate_doc_description,
+        extract_json,
         ChatGPT_API_async
     )
 except ImportError:
@@ -18,10 +23,10 @@ except ImportError:
         write_node_id,
         format_structure,
         generate_node_summary,
-        structure_to_list,
         create_clean_structure_for_description,
         generate_doc_description,
         generate_doc_description,
+        extract_json,
         ChatGPT_API_async
     )
 
@@ -46,108 +51,266 @@ except ImportError:
     from pageindex.page_index_python import build_python_file_tree
 
 
+# Directory names that never contain project source
+_SKIP_DIRS = {'__pycache__', 'node_modules', 'venv', '.venv', 'env', '.env', '.git', 'target', 'build', 'out'}
+
+# File extensions handled by build_file_tree
+_SOURCE_EXTENSIONS = ('.py', '.java', '.kt', '.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')
+
+
 def get_python_files(directory: str) -> list:
     """Recursively find all .py files in a directory."""
     python_files = []
-    for root, dirs, files in os.walk(directory):
-        # Skip hidden directories and common non-source directories
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'node_modules', 'venv', '.venv', 'env', '.env']]
-        for file in files:
-            if file.endswith('.py'):
-                python_files.append(os.path.join(root, file))
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    # Skip hidden names before any stat call
+                    if entry.name.startswith('.') or entry.name in _SKIP_DIRS:
+                        continue
+                    # DirEntry caches the file type from the readdir call,
+                    # so is_dir() avoids an extra stat per entry
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.py'):
+                        python_files.append(entry.path)
+        except PermissionError:
+            continue
     return sorted(python_files)
 
 
 
 
 
-def build_file_tree(file_path: str, model: str = None) -> dict:
+# On-disk cache of parsed file trees so repeated runs over a mostly
+# unchanged tree only re-parse files whose mtime/size changed. The version
+# tag invalidates entries when the parsers (or their grammars) change.
+_FILE_CACHE_DIR = os.path.join('results', '.pageindex_cache')
+_FILE_CACHE_VERSION = '1'
+
+
+def _file_cache_path(file_path: str, stat_result, want_text: bool = True) -> str:
+    key = f"{_FILE_CACHE_VERSION}:{os.path.abspath(file_path)}:{stat_result.st_mtime_ns}:{stat_result.st_size}:{want_text:d}"
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(_FILE_CACHE_DIR, f'{digest}.json')
+
+
+def _file_cache_get(cache_path: str):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _file_cache_put(cache_path: str, file_node: dict):
+    try:
+        os.makedirs(_FILE_CACHE_DIR, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(file_node, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except IOError:
+        pass
+
+
+# Files above this size are almost always vendored amalgamations or
+# generated blobs; parsing them stalls the build and floods the tree
+# with nodes nobody navigates
+_MAX_FILE_SIZE = 512 * 1024
+
+# Name patterns of generated files that are never worth parsing
+_GENERATED_FILE_SUFFIXES = ('_pb2.py', '_pb2_grpc.py', '.min.js')
+
+
+def _large_file_placeholder(file_path: str, size: int) -> dict:
+    """Placeholder node for a file skipped by the size guard, so the tree
+    still records its presence for navigation."""
+    return {
+        'title': os.path.basename(file_path),
+        'type': 'file',
+        'start_line': 1,
+        'end_line': 1,
+        'text': f'[file skipped: {size} bytes exceeds parse limit]',
+        'path': file_path,
+        'nodes': []
+    }
+
+
+def build_file_tree(file_path: str, model: str = None, max_file_size: int = _MAX_FILE_SIZE,
+                    want_text: bool = True) -> dict:
     """Build tree structure for a single Python or Java file."""
+    if os.path.basename(file_path).endswith(_GENERATED_FILE_SUFFIXES):
+        return None
+
+    try:
+        stat_result = os.stat(file_path)
+        # Short-circuit before the cache lookup and the read: a giant file
+        # never gets parsed, so there is nothing worth caching either
+        if max_file_size and stat_result.st_size > max_file_size:
+            return _large_file_placeholder(file_path, stat_result.st_size)
+        cache_path = _file_cache_path(file_path, stat_result, want_text)
+    except OSError:
+        cache_path = None
+
+    if cache_path:
+        cached = _file_cache_get(cache_path)
+        if cached is not None:
+            return cached
+
     if file_path.endswith('.java'):
-        return build_java_file_tree(file_path, model)
+        file_node = build_java_file_tree(file_path, model, want_text=want_text)
     elif file_path.endswith('.kt'):
-        return build_kotlin_file_tree(file_path, model)
+        file_node = build_kotlin_file_tree(file_path, model, want_text=want_text)
     elif file_path.endswith(('.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')):
-        return build_cpp_file_tree(file_path, model)
+        file_node = build_cpp_file_tree(file_path, model, want_text=want_text)
     elif file_path.endswith('.py'):
-        return build_python_file_tree(file_path, model)
-    
-    return None
+        file_node = build_python_file_tree(file_path, model, want_text=want_text)
+    else:
+        return None
+
+    if cache_path and file_node is not None:
+        _file_cache_put(cache_path, file_node)
+
+    return file_node
+
+
+def _walk_source_files(dir_path: str) -> list:
+    """Collect all source file paths under a directory with a fast scandir walk."""
+    files = []
+    stack = [dir_path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    # Skip hidden files/directories and common non-source directories
+                    if entry.name.startswith('.') or entry.name in _SKIP_DIRS:
+                        continue
+
+                    # DirEntry caches the file type, saving a stat per entry
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(_SOURCE_EXTENSIONS):
+                        files.append(entry.path)
+        except PermissionError:
+            continue
+    return sorted(files)
 
 
-def build_directory_tree(dir_path: str, model: str = None) -> dict:
+def build_directory_tree(dir_path: str, model: str = None, max_workers: int = None,
+                         want_text: bool = True) -> dict:
     """
-    Recursively process directory and build unified tree.
-    Returns a tree structure with directories containing files and code nodes (Python/Java).
+    Process a directory and build a unified tree.
+    Source files are discovered with a single scandir walk and parsed in a
+    process pool (javalang is pure Python and holds the GIL, so threads
+    don't scale on Java-heavy repos), then the directory skeleton is
+    assembled from the paths.
+    Returns a tree structure with directories containing files and code nodes.
     """
-    dir_name = os.path.basename(os.path.normpath(dir_path))
+    dir_path = os.path.normpath(dir_path)
 
-    dir_node = {
-        'title': dir_name,
+    root_node = {
+        'title': os.path.basename(dir_path),
         'type': 'directory',
         'path': dir_path,
         'nodes': []
     }
 
-    # Get all items in directory
-    try:
-        items = sorted(os.listdir(dir_path))
-    except PermissionError:
-        return dir_node
-
-    # Process subdirectories and files
-    subdirs = []
-    files = []
+    files = _walk_source_files(dir_path)
+    if not files:
+        return root_node
 
-    for item in items:
-        item_path = os.path.join(dir_path, item)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
 
-        # Skip hidden files/directories and common non-source directories
-        if item.startswith('.') or item in ['__pycache__', 'node_modules', 'venv', '.venv', 'env', '.env', '.git', 'target', 'build', 'out']:
-            continue
+    parse = functools.partial(build_file_tree, model=model, want_text=want_text)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # Batch submissions so small files don't pay one IPC round
+            # trip each
+            file_nodes = list(executor.map(parse, files, chunksize=8))
+    except (OSError, ImportError):
+        # Process pools aren't available everywhere (e.g. restricted
+        # environments); threads still overlap I/O and tree-sitter parses
+        with ThreadPoolExecutor(max_workers=min(32, max_workers * 4)) as executor:
+            file_nodes = list(executor.map(parse, files))
+
+    # Assemble the directory skeleton from the file paths; directories with
+    # no code files are never created
+    dir_nodes = {dir_path: root_node}
+
+    def get_dir_node(path):
+        node = dir_nodes.get(path)
+        if node is None:
+            node = {
+                'title': os.path.basename(path),
+                'type': 'directory',
+                'path': path,
+                'nodes': []
+            }
+            dir_nodes[path] = node
+            get_dir_node(os.path.dirname(path))['nodes'].append(node)
+        return node
 
-        if os.path.isdir(item_path):
-            subdirs.append(item_path)
-        elif item.endswith(('.py', '.java', '.kt', '.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')):
-            files.append(item_path)
-
-    # Add subdirectories first
-    for subdir_path in subdirs:
-        subdir_node = build_directory_tree(subdir_path, model)
-        # Only add if the directory contains code files (directly or nested)
-        if subdir_node and has_code_content(subdir_node):
-            dir_node['nodes'].append(subdir_node)
-
-    # Add code files
-    for file_path in files:
-        file_node = build_file_tree(file_path, model)
+    for file_path, file_node in zip(files, file_nodes):
         if file_node:
-            dir_node['nodes'].append(file_node)
+            get_dir_node(os.path.dirname(file_path))['nodes'].append(file_node)
+
+    # Keep the original child ordering: subdirectories first, then files
+    def order_children(node):
+        subdirs = [c for c in node['nodes'] if c.get('type') == 'directory']
+        others = [c for c in node['nodes'] if c.get('type') != 'directory']
+        subdirs.sort(key=lambda c: c['path'])
+        node['nodes'] = subdirs + others
+        for subdir in subdirs:
+            order_children(subdir)
 
-    return dir_node
+    order_children(root_node)
+    return root_node
 
 
 def has_code_content(node: dict) -> bool:
-    """Check if a directory node contains any code files (directly or nested)."""
-    if node.get('type') == 'file':
-        return True
+    """Check if a directory node contains any code files (directly or nested).
 
-    for child in node.get('nodes', []):
-        if has_code_content(child):
+    Iterative scan that stops at the first file found. Note that
+    build_directory_tree no longer needs this check: the scandir walk only
+    creates directory nodes on the path to an actual source file, so
+    sourceless directories are pruned before any parsing happens.
+    """
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.get('type') == 'file':
             return True
-
+        stack.extend(current.get('nodes', []))
     return False
 
 
-def clean_empty_nodes(node: dict) -> dict:
-    """Remove empty 'nodes' lists from the tree."""
-    if 'nodes' in node:
-        # Recursively clean children
-        node['nodes'] = [clean_empty_nodes(child) for child in node['nodes']]
-        # Remove if empty
-        if not node['nodes']:
+def finalize_structure(structure, drop_text: bool = False, drop_path: bool = False):
+    """
+    Final cleanup of a structure in one iterative pass: prune empty 'nodes'
+    lists and optionally drop the 'text' and 'path' fields.
+
+    Replaces separate recursive traversals for each cleanup step; works in
+    place with an explicit stack, so deeply nested trees don't hit the
+    recursion limit.
+    """
+    stack = deque(structure if isinstance(structure, list) else [structure])
+    while stack:
+        node = stack.pop()
+        if drop_text:
+            node.pop('text', None)
+        if drop_path:
+            node.pop('path', None)
+        children = node.get('nodes')
+        if children:
+            stack.extend(children)
+        elif children is not None:
             del node['nodes']
-    return node
+    return structure
 
 
 def tree_thinning_for_code(structure: dict, min_token_threshold: int, model: str) -> dict:
@@ -155,14 +318,22 @@ def tree_thinning_for_code(structure: dict, min_token_threshold: int, model: str
     Apply tree thinning to merge small code nodes.
     Similar to markdown thinning but for code structures.
     """
-    def get_node_tokens(node: dict) -> int:
-        """Calculate total tokens for a node including children."""
+    def compute_totals(node: dict) -> int:
+        """Cache each node's total token count (self + children) bottom-up,
+        so the thinning pass doesn't re-tokenize the same subtree once per
+        ancestor level."""
         text = node.get('text', '')
         total = count_tokens(text, model=model) if text else 0
         for child in node.get('nodes', []):
-            total += get_node_tokens(child)
+            total += compute_totals(child)
+        node['_total_tokens'] = total
         return total
 
+    def strip_totals(node: dict):
+        node.pop('_total_tokens', None)
+        for child in node.get('nodes', []):
+            strip_totals(child)
+
     def thin_node(node: dict) -> dict:
         """Apply thinning to a single node."""
         if 'nodes' not in node or not node['nodes']:
@@ -172,7 +343,7 @@ def tree_thinning_for_code(structure: dict, min_token_threshold: int, model: str
         node['nodes'] = [thin_node(child) for child in node['nodes']]
 
         # Check if this node's total tokens is below threshold
-        total_tokens = get_node_tokens(node)
+        total_tokens = node['_total_tokens']
 
         if total_tokens < min_token_threshold and node.get('type') in ['class', 'function', 'method']:
             # Merge children into parent
@@ -189,7 +360,89 @@ def tree_thinning_for_code(structure: dict, min_token_threshold: int, model: str
 
         return node
 
-    return thin_node(structure)
+    compute_totals(structure)
+    structure = thin_node(structure)
+    strip_totals(structure)
+    return structure
+
+
+# In-memory cache of LLM summaries keyed by a hash of the full prompt, so
+# identical code (boilerplate getters, files duplicated across packages)
+# only pays for one API call. Optionally persisted across runs.
+_SUMMARY_CACHE: dict = {}
+_SUMMARY_CACHE_PATH = os.path.join('results', '.summary_cache.json')
+_summary_cache_loaded = False
+
+
+def _summary_cache_key(prompt: str) -> str:
+    return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _load_summary_cache():
+    global _summary_cache_loaded
+    if _summary_cache_loaded:
+        return
+    _summary_cache_loaded = True
+    try:
+        with open(_SUMMARY_CACHE_PATH, 'r', encoding='utf-8') as f:
+            _SUMMARY_CACHE.update(json.load(f))
+    except (IOError, ValueError):
+        pass
+
+
+def _save_summary_cache():
+    try:
+        os.makedirs(os.path.dirname(_SUMMARY_CACHE_PATH), exist_ok=True)
+        with open(_SUMMARY_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(_SUMMARY_CACHE, f)
+    except IOError:
+        pass
+
+
+# Fixed instruction text is hoisted to a constant and placed at the start of
+# the prompt, so providers with prefix caching can reuse it across calls
+_SUMMARY_PROMPT_PREFIX = """You are given a code fragment (a class, function, or method). Generate a concise one-sentence summary of what it does.
+Directly return the summary, do not include any other text."""
+
+# Token budget for the code body included in a summary prompt
+_SUMMARY_CODE_TOKEN_BUDGET = 800
+
+
+def _truncate_to_tokens(text: str, model: str, max_tokens: int) -> str:
+    """Truncate text to roughly max_tokens tokens (by token count, not
+    characters — 3000 chars of dense code can be over 1k tokens)."""
+    num_tokens = count_tokens(text, model=model)
+    if num_tokens <= max_tokens:
+        return text
+    truncated = text
+    for _ in range(4):
+        truncated = truncated[:int(len(truncated) * max_tokens / num_tokens)]
+        num_tokens = count_tokens(truncated, model=model)
+        if num_tokens <= max_tokens:
+            break
+    return truncated + '...'
+
+
+def _is_boilerplate_code(node_text: str) -> bool:
+    """Detect bodies with no real logic (pass/... stubs), which don't need
+    an LLM call to describe."""
+    in_docstring = False
+    for line in node_text.split('\n'):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith(('"""', "'''")):
+            # Toggle unless the docstring opens and closes on the same line
+            if not (len(stripped) > 3 and stripped.endswith(('"""', "'''"))):
+                in_docstring = not in_docstring
+            continue
+        if in_docstring:
+            continue
+        if stripped.startswith(('@', 'def ', 'async def ', 'class ', '#')):
+            continue
+        if stripped not in ('pass', '...'):
+            return False
+    return True
 
 
 async def get_code_node_summary(node: dict, summary_token_threshold: int, model: str) -> str:
@@ -206,36 +459,158 @@ async def get_code_node_summary(node: dict, summary_token_threshold: int, model:
             return docstring.strip().split('\n')[0]  # First line of docstring
         return node_text[:200] if node_text else ''
 
-    # For larger nodes, generate a summary using LLM
-    prompt = f"""You are given a Python {node_type}. Generate a concise one-sentence summary of what it does.
+    # Pure boilerplate (stubs, decorator-only bodies) doesn't need an LLM call
+    if _is_boilerplate_code(node_text):
+        if docstring:
+            return docstring.strip().split('\n')[0]
+        return node_text[:200]
+
+    # For larger nodes, generate a summary using LLM; the code body is
+    # truncated by tokens so the prompt stays within a predictable budget
+    code_snippet = _truncate_to_tokens(node_text, model, _SUMMARY_CODE_TOKEN_BUDGET)
+    prompt = f"""{_SUMMARY_PROMPT_PREFIX}
 
+Type: {node_type}
 {f"Signature: {signature}" if signature else ""}
 {f"Docstring: {docstring}" if docstring else ""}
 
 Code:
-{node_text[:3000]}{"..." if len(node_text) > 3000 else ""}
+{code_snippet}"""
 
-Directly return the summary, do not include any other text."""
+    _load_summary_cache()
+    cache_key = _summary_cache_key(prompt)
+    cached = _SUMMARY_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
 
     response = await ChatGPT_API_async(model, prompt)
+    _SUMMARY_CACHE[cache_key] = response
     return response
 
 
-async def generate_summaries_for_code_structure(structure: dict, summary_token_threshold: int, model: str) -> dict:
-    """Generate summaries for all nodes in a code structure."""
-    nodes = structure_to_list([structure] if isinstance(structure, dict) else structure)
+# Node types that get an LLM summary (not directories/imports)
+_SUMMARY_NODE_TYPES = {'class', 'function', 'method', 'interface', 'enum', 'file'}
 
-    # Filter to only code nodes (not directories/files at top level unless they have meaningful content)
-    code_nodes = [n for n in nodes if n.get('type') in ['class', 'function', 'method', 'interface', 'enum', 'file']]
+# Batching limits: nodes small enough to share a prompt are grouped so the
+# fixed instruction overhead is paid once per ~10 nodes instead of per node
+_BATCH_MAX_NODES = 10
+_BATCH_TOKEN_BUDGET = 6000
 
-    tasks = [get_code_node_summary(node, summary_token_threshold, model) for node in code_nodes]
-    summaries = await asyncio.gather(*tasks)
+_BATCH_PROMPT_PREFIX = """You are given several code fragments. Generate a concise one-sentence summary for each fragment describing what it does.
+Return a JSON object mapping each fragment id to its summary, like {"1": "...", "2": "..."}. Directly return the JSON, do not include any other text."""
 
-    for node, summary in zip(code_nodes, summaries):
-        if node.get('nodes'):
-            node['prefix_summary'] = summary
-        else:
-            node['summary'] = summary
+
+def _build_batch_prompt(batch: list, model: str) -> str:
+    parts = [_BATCH_PROMPT_PREFIX]
+    for i, node in enumerate(batch, 1):
+        signature = node.get('signature', '')
+        code_snippet = _truncate_to_tokens(node.get('text', ''), model, _SUMMARY_CODE_TOKEN_BUDGET)
+        parts.append(f"""Fragment {i} ({node.get('type', '')} {node.get('title', '')}):
+{f"Signature: {signature}" if signature else ""}
+Code:
+{code_snippet}""")
+    return '\n\n'.join(parts)
+
+
+async def _summarize_batch(batch: list, summary_token_threshold: int, model: str) -> list:
+    """Summarize a group of small nodes with a single LLM call.
+
+    Falls back to per-node calls for any id missing from the parsed response.
+    """
+    prompt = _build_batch_prompt(batch, model)
+
+    _load_summary_cache()
+    cache_key = _summary_cache_key(prompt)
+    response = _SUMMARY_CACHE.get(cache_key)
+    if response is None:
+        response = await ChatGPT_API_async(model, prompt)
+        _SUMMARY_CACHE[cache_key] = response
+
+    parsed = extract_json(response)
+    summaries = []
+    for i, node in enumerate(batch, 1):
+        summary = parsed.get(str(i)) if isinstance(parsed, dict) else None
+        if not summary:
+            summary = await get_code_node_summary(node, summary_token_threshold, model)
+        summaries.append(summary)
+    return summaries
+
+
+def iter_code_nodes(structure):
+    """Yield code nodes from a structure in a single DFS, without
+    materializing intermediate lists."""
+    stack = deque(structure if isinstance(structure, list) else [structure])
+    while stack:
+        node = stack.pop()
+        if node.get('type') in _SUMMARY_NODE_TYPES:
+            yield node
+        children = node.get('nodes')
+        if children:
+            stack.extend(reversed(children))
+
+
+async def generate_summaries_for_code_structure(structure: dict, summary_token_threshold: int, model: str, max_concurrent: int = 8) -> dict:
+    """Generate summaries for all nodes in a code structure.
+
+    Concurrency is bounded by a semaphore so large repos don't fire hundreds
+    of API calls at once and trip provider rate limits.
+    """
+    sem = asyncio.Semaphore(max_concurrent)
+
+    async def bounded_single(node):
+        async with sem:
+            return [await get_code_node_summary(node, summary_token_threshold, model)]
+
+    async def bounded_batch(batch):
+        async with sem:
+            return await _summarize_batch(batch, summary_token_threshold, model)
+
+    # Group nodes that need an LLM call into shared prompts; nodes answered
+    # locally (below the threshold or boilerplate) and oversize nodes keep
+    # the single-node path
+    groups = []
+    tasks = []
+    current_batch = []
+    current_batch_tokens = 0
+
+    def flush_batch():
+        nonlocal current_batch, current_batch_tokens
+        if current_batch:
+            groups.append(current_batch)
+            tasks.append(bounded_batch(current_batch))
+            current_batch = []
+            current_batch_tokens = 0
+
+    for node in iter_code_nodes(structure):
+        node_text = node.get('text', '')
+        num_tokens = count_tokens(node_text, model=model)
+        if num_tokens < summary_token_threshold or _is_boilerplate_code(node_text) or num_tokens > _SUMMARY_CODE_TOKEN_BUDGET:
+            groups.append([node])
+            tasks.append(bounded_single(node))
+            continue
+
+        if len(current_batch) >= _BATCH_MAX_NODES or current_batch_tokens + num_tokens > _BATCH_TOKEN_BUDGET:
+            flush_batch()
+        current_batch.append(node)
+        current_batch_tokens += num_tokens
+    flush_batch()
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for group, summaries in zip(groups, results):
+        if isinstance(summaries, BaseException):
+            # One failed summary shouldn't drop the whole batch
+            titles = ', '.join(n.get('title', '') for n in group)
+            print(f"Warning: summary failed for node(s) '{titles}': {summaries}")
+            continue
+        for node, summary in zip(group, summaries):
+            if node.get('nodes'):
+                node['prefix_summary'] = summary
+            else:
+                node['summary'] = summary
+
+    # Persist so repeated runs during development reuse prior completions
+    _save_summary_cache()
 
     return structure
 
@@ -270,14 +645,20 @@ async def code_to_tree(
     """
     path = os.path.abspath(path)
 
+    # Node text is only read by thinning, summarization or the final
+    # output; when all three are off, skip attaching it entirely instead
+    # of building it and dropping it in finalize_structure
+    want_text = (if_thinning or if_add_node_summary == 'yes'
+                 or if_add_node_text == 'yes')
+
     # Build the tree structure
     if os.path.isfile(path):
         if not path.endswith(('.py', '.java', '.kt', '.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')):
             raise ValueError("File extension not supported")
-        structure = build_file_tree(path, model)
+        structure = build_file_tree(path, model, want_text=want_text)
         doc_name = os.path.splitext(os.path.basename(path))[0]
     elif os.path.isdir(path):
-        structure = build_directory_tree(path, model)
+        structure = build_directory_tree(path, model, want_text=want_text)
         doc_name = os.path.basename(os.path.normpath(path))
     else:
         raise ValueError(f"Path does not exist: {path}")
@@ -290,9 +671,6 @@ async def code_to_tree(
         print("Applying tree thinning...")
         structure = tree_thinning_for_code(structure, min_token_threshold, model)
 
-    # Clean empty nodes
-    structure = clean_empty_nodes(structure)
-
     # Add node IDs
     if if_add_node_id == 'yes':
         write_node_id([structure] if isinstance(structure, dict) else structure)
@@ -309,12 +687,9 @@ async def code_to_tree(
     # Format structure
     structure = format_structure(structure, order=base_order)
 
-    # Remove text if not requested
-    if if_add_node_text == 'no':
-        structure = remove_text_from_structure(structure)
-
-    # Remove path field from output (it was used internally)
-    structure = remove_path_from_structure(structure)
+    # Single cleanup pass: drop text if not requested, and drop the path
+    # field (it was used internally)
+    structure = finalize_structure(structure, drop_text=(if_add_node_text == 'no'), drop_path=True)
 
     # Generate document description if requested
     if if_add_doc_description == 'yes':
@@ -333,34 +708,9 @@ async def code_to_tree(
     }
 
 
-def remove_text_from_structure(structure):
-    """Remove 'text' field from all nodes in the structure."""
-    if isinstance(structure, dict):
-        structure.pop('text', None)
-        if 'nodes' in structure:
-            structure['nodes'] = [remove_text_from_structure(n) for n in structure['nodes']]
-    elif isinstance(structure, list):
-        return [remove_text_from_structure(item) for item in structure]
-    return structure
-
-
-def remove_path_from_structure(structure):
-    """Remove 'path' field from all nodes in the structure."""
-    if isinstance(structure, dict):
-        structure.pop('path', None)
-        if 'nodes' in structure:
-            structure['nodes'] = [remove_path_from_structure(n) for n in structure['nodes']]
-    elif isinstance(structure, list):
-        return [remove_path_from_structure(item) for item in structure]
-    return structure
-
-
-
 
 
 if __name__ == "__main__":
-    import json
-
     # Test on the pageindex directory
     CODE_PATH = os.path.dirname(__file__)
 
@@ -1,4 +1,5 @@
 import os
+import functools
 import tree_sitter
 try:
     import tree_sitter_c
@@ -6,18 +7,155 @@ try:
 except ImportError:
     pass
 
-def get_parser(lang_name):
-    parser = tree_sitter.Parser()
+@functools.lru_cache(maxsize=4)
+def get_language(lang_name):
+    # Language wraps a native library handle and is expensive to construct,
+    # so build it once per language
     if lang_name == 'c':
-        parser.language = tree_sitter.Language(tree_sitter_c.language())
+        return tree_sitter.Language(tree_sitter_c.language())
     elif lang_name == 'cpp':
-        parser.language = tree_sitter.Language(tree_sitter_cpp.language())
+        return tree_sitter.Language(tree_sitter_cpp.language())
+    return None
+
+
+@functools.lru_cache(maxsize=4)
+def get_parser(lang_name):
+    # Parser holds no per-file state after parse() returns, so it is safe
+    # to build once per language and reuse across files.
+    parser = tree_sitter.Parser()
+    language = get_language(lang_name)
+    if language is not None:
+        parser.language = language
     return parser
 
-def extract_nodes_from_cpp(code_content: str, lines: list, lang: str = 'cpp') -> list:
+
+# S-expression patterns matching only the declaration node types we map;
+# queries are compiled once (like DFAs) so the per-file cost is just the
+# match, and non-declaration subtrees are never visited in Python.
+_QUERY_SOURCES = {
+    'c': """
+(function_definition) @function
+(struct_specifier) @struct
+(preproc_include) @include
+""",
+    'cpp': """
+(function_definition) @function
+(class_specifier) @class
+(struct_specifier) @struct
+(namespace_definition) @namespace
+(preproc_include) @include
+""",
+}
+
+
+@functools.lru_cache(maxsize=4)
+def _get_declaration_query(lang_name):
+    try:
+        return get_language(lang_name).query(_QUERY_SOURCES[lang_name])
+    except Exception:
+        return None
+
+# Tree-sitter node types mapped to our schema (used by the recursive fallback)
+_TS_TYPE_MAP = {
+    'function_definition': 'function',
+    'template_function': 'function',
+    'class_specifier': 'class',
+    'struct_specifier': 'struct',
+    'namespace_definition': 'namespace',
+    'preproc_include': 'include',
+}
+
+
+def _make_node_data(ts_node, mapped_type, parent_type=None):
+    """Build a schema node for a matched Tree-sitter declaration node."""
+    title = None
+
+    if mapped_type == 'function':
+        # Extract name
+        declarator = ts_node.child_by_field_name('declarator')
+        if declarator:
+            title = declarator.text.decode('utf8') + "()"
+
+        if parent_type in ['class', 'struct']:
+            mapped_type = 'method'
+
+    elif mapped_type in ['class', 'struct']:
+        name_node = ts_node.child_by_field_name('name')
+        if name_node:
+            title = name_node.text.decode('utf8')
+        else:
+            title = "<anonymous>"
+
+    elif mapped_type == 'namespace':
+        name_node = ts_node.child_by_field_name('name')
+        if name_node:
+            title = name_node.text.decode('utf8')
+
+    elif mapped_type == 'include':
+        title = ts_node.text.decode('utf8').strip()
+
+    return {
+        'title': title if title else mapped_type,
+        'type': mapped_type,
+        'start_line': ts_node.start_point.row + 1,
+        'end_line': ts_node.end_point.row + 1,
+        # Byte range for exact text extraction; dropped after text attach
+        '_start_byte': ts_node.start_byte,
+        '_end_byte': ts_node.end_byte,
+        'nodes': []
+    }
+
+
+def _assemble_hierarchy(matched) -> list:
+    """Rebuild the declaration hierarchy from byte-range containment.
+
+    Takes (ts_node, mapped_type) pairs in document order (outermost node
+    first when ranges share a start) and nests each node under the nearest
+    enclosing declaration via a stack.
+    """
+    roots = []
+    stack = []
+    for ts_node, mapped_type in matched:
+        while stack and ts_node.start_byte >= stack[-1]['_end_byte']:
+            stack.pop()
+        parent_type = stack[-1]['type'] if stack else None
+        node_data = _make_node_data(ts_node, mapped_type, parent_type)
+        (stack[-1]['nodes'] if stack else roots).append(node_data)
+        stack.append(node_data)
+    return roots
+
+
+def _extract_with_query(tree, query) -> list:
+    """Collect declaration nodes via a compiled query, skipping every
+    non-declaration subtree."""
+    matched = []
+    for capture_name, ts_nodes in query.captures(tree.root_node).items():
+        for ts_node in ts_nodes:
+            matched.append((ts_node, capture_name))
+    matched.sort(key=lambda item: (item[0].start_byte, -item[0].end_byte))
+    return _assemble_hierarchy(matched)
+
+
+def _iter_declarations(root):
+    """Yield (ts_node, mapped_type) for declaration nodes in pre-order.
+
+    Generator fallback for when the query cannot compile: no per-level
+    result lists, no dict-vs-list juggling at the call sites.
+    """
+    stack = [root]
+    while stack:
+        ts_node = stack.pop()
+        mapped_type = _TS_TYPE_MAP.get(ts_node.type)
+        if mapped_type:
+            yield ts_node, mapped_type
+        # Declarations nest (namespaces, classes), so always descend
+        stack.extend(reversed(ts_node.children))
+
+
+def extract_nodes_from_cpp(code_bytes: bytes, lang: str = 'cpp') -> list:
     """
     Parse C/C++ code using Tree-sitter.
-    
+
     Args:
         lang: 'c' or 'cpp'
     """
@@ -26,102 +164,19 @@ def extract_nodes_from_cpp(code_content: str, lines: list, lang: str = 'cpp') ->
 
     try:
         parser = get_parser(lang)
-        tree = parser.parse(bytes(code_content, "utf8"))
+        tree = parser.parse(code_bytes)
     except Exception as e:
         print(f"Error parsing {lang} code: {e}")
         return []
 
-    nodes = []
-
-    def get_line_range(node):
-        return node.start_point.row + 1, node.end_point.row + 1
-
-    def process_node(ts_node, parent_type=None):
-        """Recursively process Tree-sitter nodes."""
-        
-        node_type = ts_node.type
-        
-        # Mapping Tree-sitter types to our schema
-        mapped_type = None
-        title = None
-        
-        # C/C++ specific node types
-        if node_type in ['function_definition', 'template_function']:
-            mapped_type = 'function'
-            # Extract name
-            declarator = ts_node.child_by_field_name('declarator')
-            if declarator:
-                 title = declarator.text.decode('utf8') + "()"
-            
-            if parent_type in ['class', 'struct']:
-                mapped_type = 'method'
-        
-        elif node_type in ['class_specifier', 'struct_specifier']:
-            mapped_type = 'class'
-            if node_type == 'struct_specifier':
-                mapped_type = 'struct'
-            
-            name_node = ts_node.child_by_field_name('name')
-            if name_node:
-                title = name_node.text.decode('utf8')
-            else:
-                title = "<anonymous>"
-
-        elif node_type == 'namespace_definition':
-            mapped_type = 'namespace'
-            name_node = ts_node.child_by_field_name('name')
-            if name_node:
-                title = name_node.text.decode('utf8')
-
-        elif node_type == 'preproc_include':
-             mapped_type = 'include'
-             title = ts_node.text.decode('utf8').strip()
-
-        # If it's a node we care about
-        if mapped_type:
-            start_line, end_line = get_line_range(ts_node)
-            
-            node_data = {
-                'title': title if title else mapped_type,
-                'type': mapped_type,
-                'start_line': start_line,
-                'end_line': end_line,
-                'nodes': []
-            }
-
-            # Recurse children
-            # We need to iterate over named children
-            for child in ts_node.children:
-                child_nodes = process_node(child, parent_type=mapped_type)
-                if child_nodes:
-                     node_data['nodes'].extend(child_nodes if isinstance(child_nodes, list) else [child_nodes])
-            
-            return node_data
-        
-        # If not a mapped type, just recurse children and return their results (flattened)
-        # e.g. a namespace contains classes, we want those classes.
-        # But we only want to flatten if we didn't create a node for THIS ts_node.
-        
-        results = []
-        for child in ts_node.children:
-            child_result = process_node(child, parent_type)
-            if child_result:
-                if isinstance(child_result, list):
-                    results.extend(child_result)
-                else:
-                    results.append(child_result)
-        return results
-
-    # Process root
-    root_nodes = process_node(tree.root_node)
-    
-    # helper list
-    raw_nodes = []
-    if isinstance(root_nodes, dict):
-        raw_nodes.append(root_nodes)
-    elif isinstance(root_nodes, list):
-        raw_nodes.extend(root_nodes)
-        
+    query = _get_declaration_query(lang)
+    if query is not None:
+        raw_nodes = _extract_with_query(tree, query)
+    else:
+        # Fallback: full pre-order walk when the query cannot be compiled
+        raw_nodes = _assemble_hierarchy(_iter_declarations(tree.root_node))
+
+
     # Post-process to group includes
     final_nodes = []
     current_includes = []
@@ -148,6 +203,8 @@ def extract_nodes_from_cpp(code_content: str, lines: list, lang: str = 'cpp') ->
                     'type': 'imports',
                     'start_line': current_includes[0]['start_line'],
                     'end_line': current_includes[-1]['end_line'],
+                    '_start_byte': current_includes[0]['_start_byte'],
+                    '_end_byte': current_includes[-1]['_end_byte'],
                     'nodes': include_nodes
                 })
                 current_includes = []
@@ -166,18 +223,26 @@ def extract_nodes_from_cpp(code_content: str, lines: list, lang: str = 'cpp') ->
             'type': 'imports',
             'start_line': current_includes[0]['start_line'],
             'end_line': current_includes[-1]['end_line'],
+            '_start_byte': current_includes[0]['_start_byte'],
+            '_end_byte': current_includes[-1]['_end_byte'],
             'nodes': include_nodes
          })
          
     return final_nodes
 
-def extract_node_text_content(nodes: list, lines: list) -> list:
-    """Add source code text to each node based on line ranges."""
+def extract_node_text_content(nodes: list, code_bytes: bytes) -> list:
+    """Add source code text to each node by slicing its byte range.
+
+    Tree-sitter reports exact start/end bytes, so this is a single slice
+    per node instead of re-joining a list of lines.
+    """
     def add_text_to_node(node):
-        start = node['start_line'] - 1 
-        end = node['end_line']
-        end = min(end, len(lines))
-        node['text'] = '\n'.join(lines[start:end])
+        # Re-append 'nodes' so 'text' lands before it, keeping the dict in
+        # output field order
+        children = node.pop('nodes', None)
+        node['text'] = code_bytes[node.pop('_start_byte'):node.pop('_end_byte')].decode('utf8')
+        if children is not None:
+            node['nodes'] = children
 
         for child in node.get('nodes', []):
             add_text_to_node(child)
@@ -187,34 +252,51 @@ def extract_node_text_content(nodes: list, lines: list) -> list:
 
     return nodes
 
-def build_cpp_file_tree(file_path: str, model: str = None) -> dict:
+
+def _strip_byte_ranges(nodes: list) -> list:
+    """Drop the internal byte-range keys when text is not attached."""
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        node.pop('_start_byte', None)
+        node.pop('_end_byte', None)
+        stack.extend(node.get('nodes', []))
+    return nodes
+
+
+def build_cpp_file_tree(file_path: str, model: str = None, want_text: bool = True) -> dict:
     """Build tree structure for a single C/C++ file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code_content = f.read()
+        with open(file_path, 'rb') as f:
+            code_bytes = f.read()
+        # Tree-sitter parses the raw bytes; decode once for the file text
+        code_content = code_bytes.decode('utf-8')
     except (IOError, UnicodeDecodeError):
         return None
 
-    lines = code_content.split('\n')
-
     # Determine C or C++
     ext = os.path.splitext(file_path)[1].lower()
     lang = 'c' if ext in ['.c', '.h'] else 'cpp'
 
     # Extract nodes
-    nodes = extract_nodes_from_cpp(code_content, lines, lang=lang)
-
-    # Add text content
-    nodes = extract_node_text_content(nodes, lines)
+    nodes = extract_nodes_from_cpp(code_bytes, lang=lang)
 
     file_node = {
         'title': os.path.basename(file_path),
         'type': 'file',
-        'path': file_path,
         'start_line': 1,
-        'end_line': len(lines),
-        'text': code_content,
-        'nodes': nodes
+        'end_line': code_content.count('\n') + 1,
     }
 
+    # Text attachment duplicates source across nested nodes; skip the
+    # pass when no downstream stage consumes it
+    if want_text:
+        nodes = extract_node_text_content(nodes, code_bytes)
+        file_node['text'] = code_content
+    else:
+        nodes = _strip_byte_ranges(nodes)
+
+    file_node['path'] = file_path
+    file_node['nodes'] = nodes
+
     return file_node
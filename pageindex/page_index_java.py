@@ -40,18 +40,24 @@ def extract_nodes_from_java(code_content: str, lines: list) -> list:
                 node_type = 'enum'
 
             start_line = get_line_range(ast_node)
-            # Estimate end line by looking at the next sibling or end of file
-            # This is a limitation of javalang
-            
+            # End lines are assigned afterwards from sibling positions
+            # (javalang doesn't report them)
+
+            # Keys follow the output field order so formatting can skip
+            # the reordering rebuild
             node_data = {
                 'title': ast_node.name,
                 'type': node_type,
-                'start_line': start_line,
-                'end_line': start_line, # Will be updated later
-                'docstring': ast_node.documentation,
-                'decorators': [a.name for a in ast_node.annotations] if hasattr(ast_node, 'annotations') else [],
-                'nodes': []
             }
+            # Omit absent docstring/annotations instead of storing None/[]
+            if ast_node.documentation is not None:
+                node_data['docstring'] = ast_node.documentation
+            decorators = [a.name for a in ast_node.annotations] if hasattr(ast_node, 'annotations') else []
+            if decorators:
+                node_data['decorators'] = decorators
+            node_data['start_line'] = start_line
+            node_data['end_line'] = start_line # Will be updated later
+            node_data['nodes'] = []
 
             # Process body
             if hasattr(ast_node, 'body'):
@@ -59,17 +65,7 @@ def extract_nodes_from_java(code_content: str, lines: list) -> list:
                     child_nodes = process_node(child, parent_type=node_type)
                     if child_nodes:
                         node_data['nodes'].extend(child_nodes if isinstance(child_nodes, list) else [child_nodes])
-            
-            # Helper to find the max end_line from children
-            max_child_end = start_line
-            for child in node_data['nodes']:
-                if child['end_line'] > max_child_end:
-                    max_child_end = child['end_line']
-            node_data['end_line'] = max(start_line, max_child_end)
-            
-            # Simple heuristic: expand to match braces if possible, but without token stream it's hard.
-            # We will rely on children to push the end_line down.
-            
+
             return node_data
 
         # Handle Methods and Constructors
@@ -89,28 +85,21 @@ def extract_nodes_from_java(code_content: str, lines: list) -> list:
                 signature = f"{ast_node.return_type.name} " + signature
             
             start_line = get_line_range(ast_node)
-            
+
+            # Methods are always leaves in this walker, so no 'nodes' list;
+            # the end line comes from the sibling-position pass below
             node_data = {
                 'title': f"{name}()",
                 'type': node_type,
-                'start_line': start_line,
-                'end_line': start_line, # Will set based on body
                 'signature': signature,
-                'docstring': ast_node.documentation,
-                'decorators': [a.name for a in ast_node.annotations] if hasattr(ast_node, 'annotations') else [],
-                'nodes': []
             }
-            
-            # Estimate end line based on statement body
-            if ast_node.body:
-                last_stmt = ast_node.body[-1]
-                if hasattr(last_stmt, 'position') and last_stmt.position:
-                     node_data['end_line'] = last_stmt.position.line + 1
-                else:
-                    # Fallback if no position on last statement
-                     node_data['end_line'] = start_line
-            else:
-                 node_data['end_line'] = start_line
+            if ast_node.documentation is not None:
+                node_data['docstring'] = ast_node.documentation
+            decorators = [a.name for a in ast_node.annotations] if hasattr(ast_node, 'annotations') else []
+            if decorators:
+                node_data['decorators'] = decorators
+            node_data['start_line'] = start_line
+            node_data['end_line'] = start_line # Will be updated later
 
             return node_data
 
@@ -160,16 +149,60 @@ def extract_nodes_from_java(code_content: str, lines: list) -> list:
             if result:
                 nodes.append(result)
 
+    _assign_end_lines(nodes, len(lines))
+
     return nodes
 
-def extract_node_text_content(nodes: list, lines: list) -> list:
-    """Add source code text to each node based on line ranges."""
+
+def _assign_end_lines(nodes: list, fallback_end: int):
+    """Set end lines from sibling start positions in one top-down pass.
+
+    A declaration runs until the line before its next sibling starts, or to
+    its parent's end (the end of file at the top level) for the last one —
+    a much better estimate than javalang's last-statement position.
+    """
+    for i, node in enumerate(nodes):
+        if node.get('type') in ('class', 'interface', 'enum', 'method'):
+            if i + 1 < len(nodes):
+                next_start = nodes[i + 1]['start_line'] - 1
+            else:
+                next_start = fallback_end
+            node['end_line'] = max(node['start_line'], next_start)
+        children = node.get('nodes')
+        if children:
+            _assign_end_lines(children, node['end_line'])
+
+def _line_offsets(code_content: str) -> list:
+    """Offsets of each line start, computed in one scan of the source."""
+    offsets = [0]
+    find = code_content.find
+    i = find('\n')
+    while i != -1:
+        offsets.append(i + 1)
+        i = find('\n', i + 1)
+    return offsets
+
+
+def extract_node_text_content(nodes: list, code_content: str, line_offsets: list) -> list:
+    """Add source code text to each node based on line ranges.
+
+    Uses the precomputed line-offset index so each node's text is a single
+    string slice instead of a split/join round trip.
+    """
+    num_lines = len(line_offsets)
+
     def add_text_to_node(node):
         start = node['start_line'] - 1  # Convert to 0-indexed
         end = node['end_line']
         # Ensure we don't go out of bounds
-        end = min(end, len(lines))
-        node['text'] = '\n'.join(lines[start:end])
+        end = min(end, num_lines)
+        end_offset = line_offsets[end] - 1 if end < num_lines else len(code_content)
+        # Re-append 'nodes' so 'text' lands before it, keeping the dict in
+        # output field order
+        children = node.pop('nodes', None)
+        node['text'] = code_content[line_offsets[start]:end_offset]
+        if children is not None:
+            node['nodes'] = children
 
         # Recursively process children
         for child in node.get('nodes', []):
@@ -180,30 +213,35 @@ def extract_node_text_content(nodes: list, lines: list) -> list:
 
     return nodes
 
-def build_java_file_tree(file_path: str, model: str = None) -> dict:
+def build_java_file_tree(file_path: str, model: str = None, want_text: bool = True) -> dict:
     """Build tree structure for a single Java file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code_content = f.read()
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        code_content = raw.decode('utf-8')
     except (IOError, UnicodeDecodeError):
         return None
 
+    line_offsets = _line_offsets(code_content)
     lines = code_content.split('\n')
 
     # Extract nodes from the Java file
     nodes = extract_nodes_from_java(code_content, lines)
 
-    # Add text content to nodes
-    nodes = extract_node_text_content(nodes, lines)
-
     file_node = {
         'title': os.path.basename(file_path),
         'type': 'file',
-        'path': file_path,
         'start_line': 1,
-        'end_line': len(lines),
-        'text': code_content,
-        'nodes': nodes
+        'end_line': len(line_offsets),
     }
 
+    # Text attachment duplicates source across nested nodes; skip the
+    # pass when no downstream stage consumes it
+    if want_text:
+        nodes = extract_node_text_content(nodes, code_content, line_offsets)
+        file_node['text'] = code_content
+
+    file_node['path'] = file_path
+    file_node['nodes'] = nodes
+
     return file_node
@@ -1,63 +1,93 @@
 import ast
+import hashlib
 import os
 from typing import Optional
 
-def extract_signature(node: ast.FunctionDef) -> str:
+try:
+    from . import _parse_cache
+except ImportError:
+    import _parse_cache
+
+def _unparse_cached(node, cache: Optional[dict]) -> str:
+    """ast.unparse memoized on ast.dump of the subtree.
+
+    Annotations and defaults repeat heavily within a file (Optional[str],
+    None, ...); the dump key is a shallow walk while unparse rebuilds
+    source, so sharing results across signatures pays for itself quickly.
+    """
+    if cache is None:
+        return ast.unparse(node)
+    key = ast.dump(node, annotate_fields=False)
+    text = cache.get(key)
+    if text is None:
+        text = ast.unparse(node)
+        cache[key] = text
+    return text
+
+
+def extract_signature(node: ast.FunctionDef, unparse_cache: Optional[dict] = None) -> str:
     """Extract function signature from AST node."""
     args = node.args
     parts = []
+    # Bind the hot names once; these run per argument across every
+    # definition in the file
+    append = parts.append
+    unparse = _unparse_cached
 
     # Handle positional-only args (Python 3.8+)
     if hasattr(args, 'posonlyargs'):
         for arg in args.posonlyargs:
             arg_str = arg.arg
             if arg.annotation:
-                arg_str += f': {ast.unparse(arg.annotation)}'
-            parts.append(arg_str)
+                arg_str += f': {unparse(arg.annotation, unparse_cache)}'
+            append(arg_str)
         if args.posonlyargs:
-            parts.append('/')
+            append('/')
 
     # Calculate defaults offset
+    defaults = args.defaults
     num_args = len(args.args)
-    num_defaults = len(args.defaults)
+    num_defaults = len(defaults)
     defaults_offset = num_args - num_defaults
 
     # Handle regular args
     for i, arg in enumerate(args.args):
         arg_str = arg.arg
         if arg.annotation:
-            arg_str += f': {ast.unparse(arg.annotation)}'
+            arg_str += f': {unparse(arg.annotation, unparse_cache)}'
         # Check if this arg has a default value
         default_idx = i - defaults_offset
-        if default_idx >= 0 and default_idx < len(args.defaults):
-            default_val = ast.unparse(args.defaults[default_idx])
+        if default_idx >= 0 and default_idx < num_defaults:
+            default_val = unparse(defaults[default_idx], unparse_cache)
             arg_str += f' = {default_val}'
-        parts.append(arg_str)
+        append(arg_str)
 
     # Handle *args
     if args.vararg:
         vararg_str = f'*{args.vararg.arg}'
         if args.vararg.annotation:
-            vararg_str += f': {ast.unparse(args.vararg.annotation)}'
-        parts.append(vararg_str)
+            vararg_str += f': {unparse(args.vararg.annotation, unparse_cache)}'
+        append(vararg_str)
     elif args.kwonlyargs:
-        parts.append('*')
+        append('*')
 
     # Handle keyword-only args
+    kw_defaults = args.kw_defaults
+    num_kw_defaults = len(kw_defaults)
     for i, arg in enumerate(args.kwonlyargs):
         arg_str = arg.arg
         if arg.annotation:
-            arg_str += f': {ast.unparse(arg.annotation)}'
-        if i < len(args.kw_defaults) and args.kw_defaults[i] is not None:
-            arg_str += f' = {ast.unparse(args.kw_defaults[i])}'
-        parts.append(arg_str)
+            arg_str += f': {unparse(arg.annotation, unparse_cache)}'
+        if i < num_kw_defaults and kw_defaults[i] is not None:
+            arg_str += f' = {unparse(kw_defaults[i], unparse_cache)}'
+        append(arg_str)
 
     # Handle **kwargs
     if args.kwarg:
         kwarg_str = f'**{args.kwarg.arg}'
         if args.kwarg.annotation:
-            kwarg_str += f': {ast.unparse(args.kwarg.annotation)}'
-        parts.append(kwarg_str)
+            kwarg_str += f': {unparse(args.kwarg.annotation, unparse_cache)}'
+        append(kwarg_str)
 
     # Build signature
     func_keyword = 'async def' if isinstance(node, ast.AsyncFunctionDef) else 'def'
@@ -65,7 +95,7 @@ def extract_signature(node: ast.FunctionDef) -> str:
 
     # Add return annotation
     if node.returns:
-        signature += f' -> {ast.unparse(node.returns)}'
+        signature += f' -> {unparse(node.returns, unparse_cache)}'
 
     return signature
 
@@ -80,79 +110,138 @@ def extract_docstring(node) -> Optional[str]:
     return None
 
 
-def extract_decorators(node) -> list:
+# Type-dispatch on the decorator expression; the bare-name case is the
+# common one and skips unparsing entirely
+_DECO_DISPATCH = {
+    ast.Name: lambda d, cache: f'@{d.id}',
+    ast.Attribute: lambda d, cache: f'@{_unparse_cached(d, cache)}',
+    ast.Call: lambda d, cache: f'@{_unparse_cached(d, cache)}',
+}
+
+
+def extract_decorators(node, unparse_cache: Optional[dict] = None) -> list:
     """Extract decorator names from a node."""
     decorators = []
     for decorator in node.decorator_list:
-        if isinstance(decorator, ast.Name):
-            decorators.append(f'@{decorator.id}')
-        elif isinstance(decorator, ast.Attribute):
-            decorators.append(f'@{ast.unparse(decorator)}')
-        elif isinstance(decorator, ast.Call):
-            decorators.append(f'@{ast.unparse(decorator)}')
+        handler = _DECO_DISPATCH.get(type(decorator))
+        if handler is not None:
+            decorators.append(handler(decorator, unparse_cache))
     return decorators
 
 
-def extract_nodes_from_python(code_content: str, lines: list) -> list:
+def _build_class_node(ast_node, parent_type=None, want_signature=True,
+                      want_docstring=True, want_decorators=True,
+                      unparse_cache=None) -> dict:
+    """Build a node dict (without children) for a class definition."""
+    # Keys are inserted in the output field order so downstream
+    # formatting can skip the reordering rebuild
+    class_node = {
+        'title': ast_node.name,
+        'type': 'class',
+    }
+    # Most nodes have no docstring/decorators; omitting the keys
+    # keeps node dicts in their compact small-table layout
+    if want_docstring:
+        docstring = extract_docstring(ast_node)
+        if docstring is not None:
+            class_node['docstring'] = docstring
+    if want_decorators:
+        decorators = extract_decorators(ast_node, unparse_cache)
+        if decorators:
+            class_node['decorators'] = decorators
+    class_node['start_line'] = ast_node.lineno
+    class_node['end_line'] = ast_node.end_lineno
+    class_node['nodes'] = []
+    return class_node
+
+
+def _build_function_node(ast_node, parent_type=None, want_signature=True,
+                         want_docstring=True, want_decorators=True,
+                         unparse_cache=None) -> dict:
+    """Build a node dict (without children) for a function definition."""
+    func_node = {
+        'title': f'{ast_node.name}()',
+        'type': 'method' if parent_type == 'class' else 'function',
+    }
+    if want_signature:
+        # extract_signature unparses every annotation and default, so this
+        # is the expensive field to skip
+        func_node['signature'] = extract_signature(ast_node, unparse_cache)
+    if want_docstring:
+        docstring = extract_docstring(ast_node)
+        if docstring is not None:
+            func_node['docstring'] = docstring
+    if want_decorators:
+        decorators = extract_decorators(ast_node, unparse_cache)
+        if decorators:
+            func_node['decorators'] = decorators
+    func_node['start_line'] = ast_node.lineno
+    func_node['end_line'] = ast_node.end_lineno
+    func_node['nodes'] = []
+    return func_node
+
+
+# Type-dispatch table: one dict lookup per statement instead of a chain of
+# isinstance checks
+_NODE_BUILDERS = {
+    ast.ClassDef: _build_class_node,
+    ast.FunctionDef: _build_function_node,
+    ast.AsyncFunctionDef: _build_function_node,
+}
+
+
+def _walk_definition(ast_node, want_signature=True, want_docstring=True,
+                     want_decorators=True, unparse_cache=None) -> Optional[dict]:
+    """Walk one top-level definition iteratively, emitting node dicts.
+
+    Children are appended straight into their parent's 'nodes' list as the
+    stack unwinds, so there are no intermediate per-level result lists.
+    """
+    builder = _NODE_BUILDERS.get(type(ast_node))
+    if builder is None:
+        return None
+
+    root = builder(ast_node, None, want_signature, want_docstring,
+                   want_decorators, unparse_cache)
+    builders_get = _NODE_BUILDERS.get
+    stack = [(ast_node, root)]
+    while stack:
+        parent_ast, parent_node = stack.pop()
+        children = parent_node['nodes']
+        parent_type = parent_node['type']
+        for child_ast in parent_ast.body:
+            child_builder = builders_get(type(child_ast))
+            if child_builder is None:
+                continue
+            child_node = child_builder(child_ast, parent_type, want_signature,
+                                       want_docstring, want_decorators,
+                                       unparse_cache)
+            children.append(child_node)
+            stack.append((child_ast, child_node))
+    return root
+
+
+def extract_nodes_from_python(code_content: str, lines: list, want_signature: bool = True,
+                              want_docstring: bool = True, want_decorators: bool = True,
+                              filename: str = '<code>') -> list:
     """
     Parse Python AST and extract classes/functions with line ranges.
     Returns a flat list of nodes with hierarchy information.
+
+    The want_* flags let callers that don't consume a field skip its
+    extraction (signatures in particular unparse every annotation).
     """
     try:
-        tree = ast.parse(code_content)
+        # type_comments is explicit so the parser never runs the extra
+        # comment-scanning pass; filename keeps SyntaxError messages useful
+        tree = ast.parse(code_content, filename=filename, type_comments=False)
     except SyntaxError:
         return []
 
     nodes = []
 
-    def process_node(ast_node, parent_type=None):
-        """Recursively process AST nodes."""
-        if isinstance(ast_node, ast.ClassDef):
-            class_node = {
-                'title': ast_node.name,
-                'type': 'class',
-                'start_line': ast_node.lineno,
-                'end_line': ast_node.end_lineno,
-                'docstring': extract_docstring(ast_node),
-                'decorators': extract_decorators(ast_node),
-                'nodes': []
-            }
-
-            # Process methods and nested classes
-            for child in ast_node.body:
-                child_nodes = process_node(child, parent_type='class')
-                if child_nodes:
-                    class_node['nodes'].extend(child_nodes if isinstance(child_nodes, list) else [child_nodes])
-
-            return class_node
-
-        elif isinstance(ast_node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-            # Determine if this is a method or function
-            if parent_type == 'class':
-                node_type = 'method'
-            else:
-                node_type = 'function'
-
-            func_node = {
-                'title': f'{ast_node.name}()',
-                'type': node_type,
-                'start_line': ast_node.lineno,
-                'end_line': ast_node.end_lineno,
-                'signature': extract_signature(ast_node),
-                'docstring': extract_docstring(ast_node),
-                'decorators': extract_decorators(ast_node),
-                'nodes': []
-            }
-
-            # Process nested functions/classes
-            for child in ast_node.body:
-                child_nodes = process_node(child, parent_type='function')
-                if child_nodes:
-                    func_node['nodes'].extend(child_nodes if isinstance(child_nodes, list) else [child_nodes])
-
-            return func_node
-
-        return None
+    # Unparse results are shared across all definitions in the file
+    unparse_cache = {}
 
     # Process top-level nodes
     current_imports = []
@@ -183,7 +272,8 @@ def extract_nodes_from_python(code_content: str, lines: list) -> list:
                 nodes.append(import_node)
                 current_imports = []
             
-            result = process_node(node)
+            result = _walk_definition(node, want_signature, want_docstring,
+                                      want_decorators, unparse_cache)
             if result:
                 nodes.append(result)
 
@@ -211,47 +301,91 @@ def extract_nodes_from_python(code_content: str, lines: list) -> list:
     return nodes
 
 
-def extract_node_text_content(nodes: list, lines: list) -> list:
-    """Add source code text to each node based on line ranges."""
-    def add_text_to_node(node):
-        start = node['start_line'] - 1  # Convert to 0-indexed
-        end = node['end_line']
-        node['text'] = '\n'.join(lines[start:end])
+def _line_offsets(code_content: str) -> list:
+    """Offsets of each line start, computed in one scan of the source."""
+    offsets = [0]
+    find = code_content.find
+    i = find('\n')
+    while i != -1:
+        offsets.append(i + 1)
+        i = find('\n', i + 1)
+    return offsets
+
 
-        # Recursively process children
-        for child in node.get('nodes', []):
-            add_text_to_node(child)
+def extract_node_text_content(nodes: list, code_content: str, line_offsets: list) -> list:
+    """Add source code text to each node based on line ranges.
 
-    for node in nodes:
-        add_text_to_node(node)
+    Each node's text is a single slice of the original source via the
+    precomputed line-offset index — no per-node split/join — and the walk
+    uses an explicit stack so deep trees can't hit the recursion limit.
+    """
+    num_lines = len(line_offsets)
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        start = node['start_line'] - 1  # Convert to 0-indexed
+        end = node['end_line']
+        end_offset = line_offsets[end] - 1 if end < num_lines else len(code_content)
+        # Re-append 'nodes' so 'text' lands before it, keeping the dict in
+        # output field order
+        children = node.pop('nodes', None)
+        node['text'] = code_content[line_offsets[start]:end_offset]
+        if children is not None:
+            node['nodes'] = children
+            stack.extend(children)
 
     return nodes
 
 
-def build_python_file_tree(file_path: str, model: str = None) -> dict:
+def build_python_file_tree(file_path: str, model: str = None, want_signature: bool = True,
+                           want_docstring: bool = True, want_decorators: bool = True,
+                           want_text: bool = True) -> dict:
     """Build tree structure for a single Python file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code_content = f.read()
+        # Read raw bytes and decode once: no newline translation pass, and
+        # the cache key hashes the bytes without a round trip re-encode
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        code_content = raw.decode('utf-8')
     except (IOError, UnicodeDecodeError):
         return None
 
+    # Content-hash cache: identical source parses once across runs,
+    # checkouts and copies. The flags are part of the key since they
+    # change what the tree contains.
+    flags = f'{want_signature:d}{want_docstring:d}{want_decorators:d}{want_text:d}'
+    cache_key = f'py{flags}-' + hashlib.sha256(raw).hexdigest()
+    cached = _parse_cache.get(cache_key)
+    if cached is not None:
+        # Same content may live at a different path; refresh the
+        # location-dependent fields
+        cached['title'] = os.path.basename(file_path)
+        cached['path'] = file_path
+        return cached
+
     lines = code_content.split('\n')
 
     # Extract nodes from the Python file
-    nodes = extract_nodes_from_python(code_content, lines)
-
-    # Add text content to nodes
-    nodes = extract_node_text_content(nodes, lines)
+    nodes = extract_nodes_from_python(code_content, lines, want_signature,
+                                      want_docstring, want_decorators,
+                                      filename=file_path)
 
     file_node = {
         'title': os.path.basename(file_path),
         'type': 'file',
-        'path': file_path,
         'start_line': 1,
         'end_line': len(lines),
-        'text': code_content,
-        'nodes': nodes
     }
 
+    # Add text content to nodes only when a downstream stage consumes it;
+    # text duplicates large parts of the source across nested nodes
+    if want_text:
+        line_offsets = _line_offsets(code_content)
+        nodes = extract_node_text_content(nodes, code_content, line_offsets)
+        file_node['text'] = code_content
+
+    file_node['path'] = file_path
+    file_node['nodes'] = nodes
+
+    _parse_cache.put(cache_key, file_node)
     return file_node
@@ -1,6 +1,7 @@
 import tiktoken
 import litellm
 import logging
+import functools
 import os
 from datetime import datetime
 import time
@@ -47,6 +48,24 @@ if OPENAI_BASE_URL:
     litellm.api_base = OPENAI_BASE_URL
 
 
+@functools.lru_cache(maxsize=None)
+def _encoding_for_model(model):
+    """Resolve a tiktoken encoding once per model instead of per call."""
+    return tiktoken.encoding_for_model(model)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(name):
+    return tiktoken.get_encoding(name)
+
+
+# Memoize token counts by (hash(text), model): BPE over kilobytes of source
+# is measurable CPU and the tree builders re-count identical strings. Keyed
+# by hash so the cache doesn't pin the full text in memory.
+_TOKEN_COUNT_CACHE = {}
+_TOKEN_COUNT_CACHE_MAX = 65536
+
+
 def count_tokens(text, model=None):
     """
     Count tokens in text. Uses LiteLLM's token counter which supports
@@ -55,6 +74,19 @@ def count_tokens(text, model=None):
     if not text:
         return 0
 
+    cache_key = (hash(text), model)
+    cached = _TOKEN_COUNT_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    num_tokens = _count_tokens_uncached(text, model)
+    if len(_TOKEN_COUNT_CACHE) >= _TOKEN_COUNT_CACHE_MAX:
+        _TOKEN_COUNT_CACHE.clear()
+    _TOKEN_COUNT_CACHE[cache_key] = num_tokens
+    return num_tokens
+
+
+def _count_tokens_uncached(text, model=None):
     # Try LiteLLM's token counter first (supports multiple providers)
     try:
         return litellm.token_counter(model=model or "gpt-4o", text=text)
@@ -63,13 +95,13 @@ def count_tokens(text, model=None):
 
     # Fallback to tiktoken for OpenAI models
     try:
-        enc = tiktoken.encoding_for_model(model)
+        enc = _encoding_for_model(model)
         tokens = enc.encode(text)
         return len(tokens)
     except (KeyError, Exception):
         # Fallback: use cl100k_base encoding (GPT-4 tokenizer) as approximation
         try:
-            enc = tiktoken.get_encoding("cl100k_base")
+            enc = _get_encoding("cl100k_base")
             tokens = enc.encode(text)
             return len(tokens)
         except Exception:
@@ -487,7 +519,7 @@ def add_preface_if_needed(data):
 
 
 def get_page_tokens(pdf_path, model="gpt-4o-2024-11-20", pdf_parser="PyPDF2"):
-    enc = tiktoken.encoding_for_model(model)
+    enc = _encoding_for_model(model)
     if pdf_parser == "PyPDF2":
         pdf_reader = PyPDF2.PdfReader(pdf_path)
         page_list = []
@@ -737,7 +769,12 @@ def generate_doc_description(structure, model=None):
 def reorder_dict(data, key_order):
     if not key_order:
         return data
-    return {key: data[key] for key in key_order if key in data}
+    ordered_keys = [key for key in key_order if key in data]
+    # Nodes built in canonical key order need no rebuild (dicts preserve
+    # insertion order), so the common path is a cheap comparison
+    if ordered_keys == list(data):
+        return data
+    return {key: data[key] for key in ordered_keys}
 
 
 def format_structure(structure, order=None):
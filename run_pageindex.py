@@ -8,6 +8,25 @@ from pageindex import *
 from pageindex.page_index_md import md_to_tree
 from pageindex.page_index_code import code_to_tree
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dump_json(obj, output_file):
+    """Write the result tree as indented UTF-8 JSON.
+
+    orjson's C encoder is several times faster than the stdlib
+    pretty-printer on large trees; fall back to json when unavailable.
+    """
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False)
+
 # Suppress SSL cleanup errors on exit (Python 3.9 issue)
 if sys.version_info < (3, 10):
     import warnings
@@ -59,9 +78,20 @@ def run_async(coro):
                 loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
         except Exception:
             pass
-        # Give time for SSL connections to close gracefully
+        # Let async generators finalize before the loop goes away
         try:
-            loop.run_until_complete(asyncio.sleep(0.25))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        except Exception:
+            pass
+        # Give SSL connections time to close gracefully — but only when
+        # transports are actually still open; short runs that never made a
+        # network call shouldn't pay a fixed 250ms
+        try:
+            # _transports is a WeakValueDictionary on the selector loops;
+            # fall back to sleeping if the attribute ever disappears
+            transports = getattr(loop, '_transports', None)
+            if transports is None or len(transports):
+                loop.run_until_complete(asyncio.sleep(0.25))
         except Exception:
             pass
         loop.close()
@@ -141,8 +171,7 @@ if __name__ == "__main__":
         output_file = f'{output_dir}/{pdf_name}_structure.json'
         os.makedirs(output_dir, exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(toc_with_page_number, f, indent=2)
+        dump_json(toc_with_page_number, output_file)
         
         print(f'Tree structure saved to: {output_file}')
             
@@ -192,8 +221,7 @@ if __name__ == "__main__":
         output_file = f'{output_dir}/{md_name}_structure.json'
         os.makedirs(output_dir, exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(toc_with_page_number, f, indent=2, ensure_ascii=False)
+        dump_json(toc_with_page_number, output_file)
 
         print(f'Tree structure saved to: {output_file}')
 
@@ -246,7 +274,6 @@ if __name__ == "__main__":
         output_file = f'{output_dir}/{code_name}_code_structure.json'
         os.makedirs(output_dir, exist_ok=True)
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(toc_with_page_number, f, indent=2, ensure_ascii=False)
+        dump_json(toc_with_page_number, output_file)
 
         print(f'Tree structure saved to: {output_file}')
\ No newline at end of file